@@ -1,9 +1,21 @@
+import atexit
+import hashlib
+import itertools
 import os
+import re
+import shutil
 import subprocess
 import sys
-from shutil import which
+import tempfile
+import threading
+import traceback
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
-if which("pasim") is None:
+# The path to the Patmos simulator, looked up once
+pasim_path = shutil.which("pasim")
+
+if pasim_path is None:
     print("Patmos simulator 'pasim' could not be found.")
     sys.exit(1)
 
@@ -35,164 +47,463 @@ start_function = sys.argv[5]
 # The first execution argument
 exec_arg = sys.argv[first_exec_arg_index]
 
+# Creates a directory for intermediate files that is deleted on exit.
+# Uses tmpfs when available, such that the files never reach the disk.
+def make_scratch_dir():
+    try:
+        scratch = tempfile.mkdtemp(prefix="patmos-", dir="/dev/shm")
+    except OSError:
+        scratch = tempfile.mkdtemp(prefix="patmos-")
+    atexit.register(shutil.rmtree, scratch, ignore_errors=True)
+    return scratch
+
+# Directory for the intermediate files of this run,
+# e.g., the object files and ELFs of each combination
+scratch_dir = make_scratch_dir()
+
+# Runs the given command list without input, discarding its stdout.
+# Returns the completed process, with the command's stderr captured as bytes.
+def run_quietly(argv):
+    return subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+# Whether commands can be spawned directly, which requires Python 3.8
+can_spawn = hasattr(os, "posix_spawnp")
+
+# The spawn file actions giving a command no input and discarding its stdout
+if can_spawn:
+    SPAWN_QUIET_ACTIONS = [
+        (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+        (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+    ]
+
+# Starts the given command list without input, discarding its stdout.
+# Uses 'os.posix_spawnp' directly, which avoids the per-process overhead of 'subprocess'.
+# Falls back to 'subprocess' where 'os.posix_spawnp' isn't available.
+# Returns the process and a binary file reading the command's stderr.
+# The process must be waited for using 'wait_for'.
+def spawn_quietly(argv):
+    if not can_spawn:
+        process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return process, process.stderr
+    
+    stderr_read, stderr_write = os.pipe()
+    try:
+        pid = os.posix_spawnp(argv[0], argv, os.environ, 
+            file_actions=SPAWN_QUIET_ACTIONS + [(os.POSIX_SPAWN_DUP2, stderr_write, 2)])
+    except OSError:
+        os.close(stderr_read)
+        raise
+    finally:
+        os.close(stderr_write)
+    return pid, open(stderr_read, "rb")
+
+# Waits for the given process from 'spawn_quietly' to finish.
+# Returns its exit code, or the negated signal number if it was killed by a signal.
+def wait_for(process):
+    if not can_spawn:
+        return process.wait()
+    
+    status = os.waitpid(process, 0)[1]
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+# Directory where object files produced by llc are cached across runs.
+# It is placed next to the test output, such that it is removed with the build.
+llc_cache_dir = os.path.join(os.path.dirname(os.path.abspath(compiled)), "patmos-llc-cache")
+
+# The maximum number of object files kept in the cache
+llc_cache_size = 1024
+
+# Removes the least recently used object files from the cache
+# until it holds at most 'llc_cache_size' files.
+def prune_llc_cache():
+    entries = []
+    for entry in os.scandir(llc_cache_dir):
+        try:
+            entries.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            # Removed by a concurrent run
+            pass
+    entries.sort()
+    for _, path in entries[:max(0, len(entries) - llc_cache_size)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# Compiles the given source file (arg 1) using llc with the given arguments (arg 2)
+# into an object file at the given path (arg 3), which must differ from the source file.
+# The object file is cached, keyed by the source's content, the arguments, and the llc binary,
+# such that repeating an identical compilation only copies the cached result.
+# Returns llc's error output if the compilation failed, otherwise None.
+def cached_llc(source, args, out):
+    llc = bin_dir + "/llc"
+    with open(source, "rb") as f:
+        key = hashlib.sha256(f.read() + " ".join(args).encode() + str(os.path.getmtime(llc)).encode()).hexdigest()
+    cached = os.path.join(llc_cache_dir, key + ".o")
+    
+    try:
+        shutil.copyfile(cached, out)
+    except OSError:
+        # Not cached (or removed by a concurrent run)
+        pass
+    else:
+        try:
+            # Mark the entry as recently used
+            os.utime(cached)
+        except OSError:
+            # Only affects which entries are pruned first
+            pass
+        return None
+    
+    llc_result = run_quietly([llc, source] + args + ["-filetype=obj", "-o", out])
+    if llc_result.returncode != 0:
+        return llc_result.stderr.decode(errors="replace")
+    
+    # Store the result. Copy to a unique name first, such that concurrent runs
+    # never see a partially written cache entry.
+    try:
+        os.makedirs(llc_cache_dir, exist_ok=True)
+        staged = cached + "." + str(os.getpid()) + "." + str(threading.get_ident())
+        shutil.copyfile(out, staged)
+        os.replace(staged, cached)
+        prune_llc_cache()
+    except OSError:
+        # Caching is only an optimization
+        pass
+    return None
+
+# The parsing states of 'pasim_stat_clean'
+SEEK_INSTR, READ_INSTR, SEEK_CYCLES, SEEK_PROF, READ_PROF = range(5)
+
+# Matches the lines of pasim's statistics that mark the sections 'pasim_stat_clean' looks for.
+# The name of the matched group identifies the marker.
+PASIM_STAT_MARKER = re.compile(rb"\s*(?:"
+    rb"(?P<instr>Instruction Statistics:)\s*$|"
+    rb"(?P<options>Pasim options:)\s*$|"
+    rb"(?P<all>all:)|"
+    rb"Cycles:\s+(?P<cycles>\S+)|"
+    rb"(?P<prof>Profiling information:)|"
+    rb"<(?P<function>[^>]*))")
+
+# Matches a line of the instruction statistics, capturing the name and the two fetch counts
+PASIM_STAT_INSTR = re.compile(rb"\s*(\S+)\s+(\d+)\s+\S+\s+\S+\s+(\d+)")
+
+# The text in the marker lines searched for by the seeking states of 'pasim_stat_clean'.
+# In these states, lines without the text are skipped using a plain substring search.
+SEEK_TEXT = {SEEK_CYCLES: b"Cycles:", SEEK_PROF: b"Profiling information:"}
+
+# The pasim statistics needed to ensure two runs of a singlepath
+# program are identical (execution-wise).
+# 'instrs' holds the fetch count of each instruction and 'profile' the number
+# of calls of each function, both as (name, count) pairs in the order pasim printed them.
+class Stats(namedtuple("Stats", ["instrs", "cycles", "profile"])):
+    __slots__ = ()
+    
+    # Describes how these statistics differ from the given ones.
+    def difference(self, other):
+        diff = []
+        for kind, mine, theirs in [("Instructions", self.instrs, other.instrs), ("Profile", self.profile, other.profile)]:
+            for row, (my_row, their_row) in enumerate(itertools.zip_longest(mine, theirs)):
+                if my_row != their_row:
+                    diff.append(kind + " row " + str(row) + ": " + str(my_row) + " != " + str(their_row) + "\n")
+        if self.cycles != other.cycles:
+            diff.append("Cycles: " + str(self.cycles) + " != " + str(other.cycles) + "\n")
+        return "".join(diff)
+
 # It cleans the given pasim statistics
 # leaving only the stats needed to ensure two run of a singlepath
 # program are identical (execution-wise).
+# The statistics are given as an iterable of byte lines, e.g., a binary file.
+# They are not decoded, only the names in the cleaned statistics are.
+# Returns the cleaned statistics as 'Stats'.
 def pasim_stat_clean(stats):
-    input = stats.splitlines()
-    output = ""
-    currentLine = 0;
-    #Find the instruction statistics
-    while input[currentLine].strip() != "Instruction Statistics:":
-        if input[currentLine].strip() == "Pasim options:":
-            raise ValueError("No pasim statistics given.")
-        currentLine+=1
-    currentLine +=2 #Discard the found header and the following line
-    
-    #output cleaned instruction statistics
-    while not input[currentLine].strip().startswith("all:"):
-        split_line = input[currentLine].split()
-        name = split_line[0]
-        fetch_count = int(split_line[1]) + int(split_line[4])
-        output += name + " " + str(fetch_count)+"\n"
-        currentLine+=1
-    currentLine+=1 # Discard the "all:"
-    
-    #Find and output cycle count
-    while not input[currentLine].strip().startswith("Cycles:"):
-        currentLine+=1
-    split = input[currentLine].split()
-    output += split[0] + " " + split[1] + "\n"
-    currentLine+=1
-    
-    #Find profiling information
-    while not input[currentLine].strip().startswith("Profiling information:"):
-        currentLine+=1
-    #Discard the header and next 3 lines, which are just table headers
-    currentLine+=4
-            
-    #Output how many times each function is called
-    while True:
-        line = input[currentLine].strip()
-        currentLine+=1
-        if line.startswith("<"):
-            currentLine+=1 #Discard next line
-            count = input[currentLine].strip().split()[0]
-            currentLine+=1
-            output += line[1:].split(">")[0] + "(): " + count + "\n"
+    lines = iter(stats)
+    instrs = []
+    cycles = None
+    profile = []
+    state = SEEK_INSTR
+    for line in lines:
+        seek_text = SEEK_TEXT.get(state)
+        if seek_text is not None and seek_text not in line:
+            continue
+        match = PASIM_STAT_MARKER.match(line)
+        marker = match.lastgroup if match else None
+        if state == SEEK_INSTR:
+            #Find the instruction statistics
+            if marker == "options":
+                raise ValueError("No pasim statistics given.")
+            if marker == "instr":
+                next(lines, None) #Discard the line following the header
+                state = READ_INSTR
+        elif state == READ_INSTR:
+            #output cleaned instruction statistics
+            if marker == "all":
+                state = SEEK_CYCLES
+            else:
+                instr = PASIM_STAT_INSTR.match(line)
+                if instr is None:
+                    raise ValueError("Invalid instruction statistics: " + line.decode(errors="replace"))
+                name = instr.group(1).decode(errors="replace")
+                fetch_count = int(instr.group(2)) + int(instr.group(3))
+                instrs.append((name, fetch_count))
+        elif state == SEEK_CYCLES:
+            #Find and output cycle count
+            if marker == "cycles":
+                cycles = int(match.group("cycles"))
+                state = SEEK_PROF
+        elif state == SEEK_PROF:
+            #Find profiling information
+            if marker == "prof":
+                #Discard the next 3 lines, which are just table headers
+                for _ in range(3):
+                    next(lines, None)
+                state = READ_PROF
         else:
-            #Not part of the profiling
-            break;
+            #Output how many times each function is called
+            if marker == "function":
+                next(lines, None) #Discard next line
+                name = match.group("function").decode(errors="replace")
+                count = next(lines, b"").split()
+                if not count:
+                    raise ValueError("Missing call count of function: " + name)
+                count = int(count[0])
+                profile.append((name, count))
+            else:
+                #Not part of the profiling
+                break
     
-    return output
+    if state != READ_PROF:
+        raise ValueError("Incomplete pasim statistics given.")
+    return Stats(tuple(instrs), cycles, tuple(profile))
     
+# Cleaned statistics of successful executions, keyed by the hash of the executed program
+# and the execution argument. Holds at most 'stat_cache_size' entries, evicting the least recently used.
+stat_cache = OrderedDict()
+stat_cache_size = 256
+stat_cache_lock = threading.Lock()
+
 # Executes the given program (arg 1), running statistics on the given function (arg 2).
+# 'program_name' is the path of the program to use in reports.
 # Argument 3 is the execution arguments (see top of file for description).
+# 'arg_index' is the position of the execution argument on the command line,
+# which makes the ELF of each execution unique.
 # Tests that the output of the program match the expected output. If not, reports an error.
-# Returns the cleaned statistics.
-def execute_and_stat(program, args):
+# Returns whether the execution failed and otherwise the cleaned statistics as 'Stats'.
+# If 'need_stats' is false, no statistics are gathered and None is returned instead.
+# Identical programs are only executed once for each execution argument.
+def execute_and_stat(program, program_name, args, arg_index, need_stats):
 	# Split the execution argument into input and expected output.
     split = args.split("=", 1)
     input = split[0]
     expected_out = split[1]
     
-    # The final name of the ELF to execute
-    exec_name = program + input
+    with open(program, "rb") as f:
+        cache_key = (hashlib.sha256(f.read()).hexdigest(), args, need_stats)
+    with stat_cache_lock:
+        if cache_key in stat_cache:
+            stat_cache.move_to_end(cache_key)
+            return False, stat_cache[cache_key]
+    
+    # The final name of the ELF to execute.
+    # It is only needed for this execution, so it is kept in the scratch directory.
+    exec_name = os.path.join(scratch_dir, os.path.basename(program) + "." + str(arg_index) + "." + input)
     
     # Final generation of ELF with added input
-    if subprocess.run(["ld.lld", "-nostdlib", "-static", "-o", exec_name, program, 
-        "--defsym", "input=" + input]).returncode != 0:
-        return True, args + "\nFailed to generate executable from '" + program + "' for argument '" + input + "'"
+    ld, ld_stderr = spawn_quietly(["ld.lld", "-nostdlib", "-static", "-o", exec_name, program, 
+        "--defsym", "input=" + input])
+    with ld_stderr:
+        ld_errors = ld_stderr.read()
+    if wait_for(ld) != 0:
+        return True, args + "\nFailed to generate executable from '" + program_name + "' for argument '" + input + "'\n" + \
+            ld_errors.decode(errors="replace")
         
-    pasim_result = subprocess.run(["pasim", exec_name, "-V", "-D", "ideal"], 
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-    program_output=pasim_result.stdout
-    pasim_stats=pasim_result.stderr
-    
-    if int(expected_out) != pasim_result.returncode:
-        sys.stderr.write("The execution of '" + program + "' for input argument '" + input + "' gave the wrong output through stdout.\n")
-        sys.stderr.write("-------------------- Expected --------------------\n")
-        sys.stderr.write(expected_out + "\n")
-        sys.stderr.write("--------------------- Actual ---------------------\n")
-        sys.stderr.write(str(pasim_result.returncode) + "\n")
-        sys.stderr.write("--------------------- stdout ---------------------\n")
-        sys.stderr.write(program_output + "\n")
-        sys.stderr.write("--------------------- stderr ---------------------\n")
-        sys.stderr.write(pasim_stats + "\n")
-        sys.stderr.write("--------------------------------------------------\n")
-        return True, ""
+    pasim_argv = [pasim_path, exec_name, "-D", "ideal"]
+    
+    if need_stats:
+        pasim_argv.append("-V")
+    pasim, pasim_stderr = spawn_quietly(pasim_argv)
+    cleaned_stats = None
+    invalid_stats = False
+    with pasim_stderr:
+        if need_stats:
+            # Clean 'pasim's statistics while they are being printed
+            try: 
+                cleaned_stats = pasim_stat_clean(pasim_stderr)
+            except ValueError:
+                # If cleaning failed it means the stderr is not statistics and some other
+                # error was printed
+                invalid_stats = True
+        # Consume the rest, such that 'pasim' doesn't block on a full pipe
+        while pasim_stderr.read(1 << 16):
+            pass
+    pasim_exit_code = wait_for(pasim)
     
-    # Clean 'pasim's statistics
-    try: 
-        return False, pasim_stat_clean(pasim_stats)
-    except ValueError:
-		# If cleaning failed it means the stderr is not statistics and some other
-		# error was printed
-        sys.stderr.write("--------------------- stderr ---------------------\n")
-        sys.stderr.write(pasim_stats + "\n")
-        sys.stderr.write("--------------------------------------------------\n")
+    if int(expected_out) != pasim_exit_code or invalid_stats:
+        # The output of the execution isn't kept, so rerun it to report the failure
+        pasim_result = subprocess.run(pasim_argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        pasim_stats = pasim_result.stderr.decode(errors="replace")
+        
+        # Write the report at once, such that it doesn't interleave with
+        # reports from concurrent executions
+        report = []
+        if int(expected_out) != pasim_exit_code:
+            report += [
+                "The execution of '" + program_name + "' for input argument '" + input + "' gave the wrong output through stdout.\n",
+                "-------------------- Expected --------------------\n",
+                expected_out + "\n",
+                "--------------------- Actual ---------------------\n",
+                str(pasim_exit_code) + "\n",
+                "--------------------- stdout ---------------------\n",
+                pasim_result.stdout.decode(errors="replace") + "\n",
+            ]
+        report += [
+            "--------------------- stderr ---------------------\n",
+            pasim_stats + "\n",
+            "--------------------------------------------------\n",
+        ]
+        sys.stderr.write("".join(report))
         return True, ""
+    
+    with stat_cache_lock:
+        stat_cache[cache_key] = cleaned_stats
+        if len(stat_cache) > stat_cache_size:
+            stat_cache.popitem(last=False)
+    return False, cleaned_stats
        
+# Raised when compiling or testing a configuration fails.
+# The message is the full report to be printed for the configuration.
+class TestFailure(Exception):
+    pass
+
 # Compile and test using the given LLC arguments.
-def compile_and_test(llc_args):
+# The program is compiled to the given path, which must be unique
+# to this call such that configurations can be tested concurrently.
+# If the test fails after compiling, the object file is copied to 'kept',
+# which is also the path reports refer to.
+# At most 'exec_jobs' executions are run at the same time.
+def compile_and_test(llc_args, compiled, kept, exec_jobs):
+    object_compiled = False
     def throw_error(*msgs):
-        for msg in msgs:
-            print(msg, end = '')
-        print("\nLLC args: ", llc_args)
-        sys.exit(1)
+        message = "".join(msgs)
+        if object_compiled:
+            shutil.copyfile(compiled, kept)
+            message += "\nObject file:  " + kept
+        raise TestFailure(message + "\nLLC args:  " + llc_args)
         
     using_singlepath = "-mpatmos-singlepath=" in llc_args
+    llc_argv = llc_args.split()
         
-    # Try to compile the program to rule out compile errors. Throw out the result.
-    if subprocess.run([bin_dir+"/llc", source_to_test] + llc_args.split() + ["-filetype=obj", "-o", compiled]).returncode != 0:
-        throw_error("Failed to compile ", source_to_test)
-
-    # Link start function with program
-    if subprocess.run([bin_dir+"/llvm-link", start_function, source_to_test, "-o", compiled]).returncode != 0:
-        throw_error("Failed to link '", source_to_test, "' and '", start_function, "'")
+    # Link start function with program.
+    # The linked bitcode gets its own file, such that a cache copy never overwrites llc's input.
+    linked = os.path.splitext(compiled)[0] + ".bc"
+    link_result = run_quietly([bin_dir+"/llvm-link", start_function, source_to_test, "-o", linked])
+    if link_result.returncode != 0:
+        throw_error("Failed to link '", source_to_test, "' and '", start_function, "'\n", 
+            link_result.stderr.decode(errors="replace"))
         
     # Compile into object file (not ELF yet)
-    if subprocess.run([bin_dir+"/llc", compiled] + llc_args.split() + ["-filetype=obj", "-o", compiled]).returncode != 0:
-        throw_error("Failed to compile '", source_to_test, "'")
+    llc_errors = cached_llc(linked, llc_argv, compiled)
+    if llc_errors is not None:
+        # Find out whether the program itself fails to compile or only
+        # the program linked with the start function.
+        if run_quietly([bin_dir+"/llc", source_to_test] + llc_argv + ["-filetype=null", "-o", os.devnull]).returncode != 0:
+            throw_error("Failed to compile '", source_to_test, "'\n", llc_errors)
+        throw_error("Failed to compile '", source_to_test, "' linked with '", start_function, "'\n", llc_errors)
+    object_compiled = True
 
      
     # Run the first execution argument on its own,
     # such that its stats result can be compared to
     # all other executions
-    first_stats_failed, first_stats=execute_and_stat(compiled, exec_arg)
+    first_stats_failed, first_stats=execute_and_stat(compiled, kept, exec_arg, first_exec_arg_index, using_singlepath)
     if first_stats_failed:
         throw_error(first_stats)
 
       
     # Run the rest of the execution arguments.
+    # Each execution uses its own ELF, so they are run concurrently.
+    # Identical arguments are only run once.
+    # Maps each distinct argument to its position on the command line.
+    rest_args = {}
+    for arg_index in range(first_exec_arg_index+1, len(sys.argv)):
+        rest_args.setdefault(sys.argv[arg_index], arg_index)
+    with ThreadPoolExecutor(max_workers=min(exec_jobs, len(rest_args))) as executor:
+        rest_results = list(executor.map(
+            lambda arg: execute_and_stat(compiled, kept, arg, rest_args[arg], using_singlepath), rest_args))
+    
     # For each one, compare to the first. If they all
     # are equal to the first, they must also be equal to each other,
     # so we don't need to compare them to each other.
-    for i in sys.argv[first_exec_arg_index:]:
-            
-        rest_failed, rest_stats=execute_and_stat(compiled, i)
+    for i, (rest_failed, rest_stats) in zip(rest_args, rest_results):
         if rest_failed:
-            throw_error()
+            throw_error(rest_stats)
         
         if using_singlepath:
             if first_stats != rest_stats:
-                import difflib
-                sys.stderr.writelines(difflib.context_diff(first_stats.split("\n"), rest_stats.split("\n")))
-                throw_error("The execution of '", compiled, "' for execution arguments '", exec_arg, "' and '", i, "' weren't equivalent")
+                throw_error(first_stats.difference(rest_stats), 
+                    "The execution of '", kept, "' for execution arguments '", exec_arg, "' and '", i, "' weren't equivalent")
+
+# Estimates the relative cost of compiling and testing using the given LLC arguments.
+# Higher optimization levels and dual-issue take longer to compile.
+def test_cost(llc_args):
+    flags = llc_args.split()
+    cost = 3 if "-O2" in flags else 2 if "-O1" in flags else 1
+    if "-mpatmos-disable-vliw=false" in flags:
+        cost += 1
+    return cost
 
 # Compile and test all compinations in the given matrix
 # Each list in the matrix is a group of flags that each
 # should be compled/test with every element in the other groups.
 #
-# The matrix argument are added to the given arguments
-def compile_and_test_matrix(llc_args, matrix):
-    if len(matrix) == 0:
-        compile_and_test(llc_args)
-    else:
-        for arg in matrix[0]:
-            compile_and_test_matrix(llc_args + " " + arg, matrix[1:])
+# Combinations that result in the same set of flags are only tested once.
+# The combinations are independent, so they are tested concurrently.
+# The most expensive ones are started first, such that no worker is left
+# with a long combination once the others are done.
+# All failures are reported, not just the first one.
+# Returns whether all combinations succeeded.
+def compile_and_test_matrix(matrix):
+    configs = {}
+    for flags in itertools.product(*matrix):
+        llc_args = " ".join(" ".join(flags).split())
+        configs.setdefault(tuple(sorted(llc_args.split())), llc_args)
+    worklist = list(configs.values())
+    
+    # Each combination is compiled to its own object file in the scratch directory
+    staged = [os.path.join(scratch_dir, os.path.basename(compiled) + "." + str(i) + ".o") for i in range(len(worklist))]
+    
+    # Split the available cores between the combinations and their executions,
+    # such that no more commands than cores are run at the same time
+    jobs = os.cpu_count() or 1
+    config_jobs = min(jobs, len(worklist))
+    exec_jobs = max(1, jobs // config_jobs)
+    
+    futures = [None] * len(worklist)
+    with ThreadPoolExecutor(max_workers=config_jobs) as executor:
+        for i in sorted(range(len(worklist)), key=lambda i: test_cost(worklist[i]), reverse=True):
+            futures[i] = executor.submit(compile_and_test, worklist[i], staged[i], 
+                compiled + "." + str(i) + ".o", exec_jobs)
+    
+    succeeded = True
+    for i, future in enumerate(futures):
+        try:
+            future.result()
+        except TestFailure as failure:
+            print(failure)
+            succeeded = False
+        except Exception:
+            # Unexpected errors only fail their own combination
+            print(traceback.format_exc() + "LLC args:  " + worklist[i])
+            succeeded = False
+    
+    if succeeded:
+        # Output the object file of the last combination, as if they had been compiled in sequence
+        shutil.copyfile(staged[-1], compiled)
+    return succeeded
 
-compile_and_test_matrix("", [
+if not compile_and_test_matrix([
     [
         "", # Traditional code
         "-mpatmos-singlepath=main", # Single-path code without dual-issue
@@ -200,7 +511,8 @@ compile_and_test_matrix("", [
     ],
     # Optimization levels
     ["", "-O1", "-O2"]
-])
+]):
+    sys.exit(1)
 
 # Success
 sys.exit(0)